@@ -0,0 +1,140 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Final, List, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api_service import get_ip_address
+from db import ConcurrencyLimit, PoolSaturated
+
+admission_default_concurrency: Final[int] = int(os.getenv("ADMISSION_DEFAULT_CONCURRENCY", "256"))
+admission_default_max_queue: Final[int] = int(os.getenv("ADMISSION_DEFAULT_MAX_QUEUE", "512"))
+admission_stream_concurrency: Final[int] = int(os.getenv("ADMISSION_STREAM_CONCURRENCY", "1024"))
+admission_export_concurrency: Final[int] = int(os.getenv("ADMISSION_EXPORT_CONCURRENCY", "2"))
+admission_export_max_queue: Final[int] = int(os.getenv("ADMISSION_EXPORT_MAX_QUEUE", "2"))
+admission_max_wait: Final[float] = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "0.5"))
+admission_retry_after: Final[int] = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+client_rate: Final[float] = float(os.getenv("ADMISSION_CLIENT_RATE", "20"))
+client_burst: Final[float] = float(os.getenv("ADMISSION_CLIENT_BURST", "40"))
+client_max_tracked: Final[int] = int(os.getenv("ADMISSION_CLIENT_MAX_TRACKED", "10000"))
+
+
+class RouteClass(ConcurrencyLimit):
+    """
+    Request-level limit for a group of paths. Pool waits are not limited here: replica
+    statements pass their engine's pool gate (db.pool_gates) and fail with PoolSaturated.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float) -> None:
+        super().__init__(concurrency, max_queue, max_wait)
+        self.name = name
+
+
+class ClientRateLimiter:
+    """
+    Token bucket per client address (per worker process).
+    Only the most recently seen `max_tracked` clients are kept.
+    """
+
+    def __init__(self, rate: float, burst: float, max_tracked: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_tracked = max_tracked
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Take one token. Returns 0 when allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic()
+        tokens, stamp = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_tracked:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# long-lived streams (SSE feed) share one DB poller and must not count against the default class
+stream_route_class = RouteClass("stream", admission_stream_concurrency, 0, admission_max_wait)
+# each export holds a replica connection (and its pool gate slot) for the whole stream, so only
+# a few may run per worker; the rest are shed before the response starts
+export_route_class = RouteClass("export", admission_export_concurrency, admission_export_max_queue, admission_max_wait)
+default_route_class = RouteClass(
+    "default", admission_default_concurrency, admission_default_max_queue, admission_max_wait
+)
+
+# path prefix -> route class, first match wins
+route_classes: List[Tuple[str, RouteClass]] = [
+    ("/api/organizations/feed", stream_route_class),
+    ("/api/export", export_route_class),
+]
+
+client_rate_limiter = ClientRateLimiter(client_rate, client_burst, client_max_tracked)
+
+
+def route_class_for(path: str) -> RouteClass:
+    for prefix, route_class in route_classes:
+        if path.startswith(prefix):
+            return route_class
+    return default_route_class
+
+
+def _client_address(scope: Scope) -> str:
+    try:
+        return get_ip_address(Headers(scope=scope).get("x-forwarded-for"))
+    except (HTTPException, IndexError):
+        # no usable X-Forwarded-For (not behind the load balancer): limit by the peer address,
+        # or put every such request in one shared bucket when there is none
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+
+async def pool_saturated_handler(request: Request, exc: PoolSaturated) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "ERROR.ADMISSION.OVERLOADED"},
+        status_code=503,
+        headers={"Retry-After": str(admission_retry_after)},
+    )
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        wait = client_rate_limiter.take(_client_address(scope))
+        if wait > 0:
+            response = JSONResponse(
+                {"detail": "ERROR.ADMISSION.TOO_MANY_REQUESTS"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+
+        route_class = route_class_for(scope["path"])
+        if not await route_class.acquire():
+            response = JSONResponse(
+                {"detail": "ERROR.ADMISSION.OVERLOADED"},
+                status_code=503,
+                headers={"Retry-After": str(admission_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
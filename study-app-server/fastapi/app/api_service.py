@@ -1,28 +1,47 @@
+import asyncio
+import heapq
+import hmac
+import itertools
 import os
 import random
 from types import SimpleNamespace
-from typing import AsyncGenerator, Final
+from typing import Any, AsyncGenerator, Awaitable, Callable, Final, List, TypeVar
 
 import aiohttp
 from fastapi import Header, HTTPException
 
-from sqlalchemy import text
+from sqlalchemy import Executable, text
+from sqlalchemy.orm import sessionmaker
 
-from db import MainSessionLocal, ReplicationSessionLocals
+from db import LazySession, MainSessionLocal, ReplicationSessionLocals, Shard, Shards, shard_for
 
 
 is_local: Final[bool] = os.getenv("ENV") == "local"
+# bulk exports are refused entirely while this is unset
+export_api_token: Final[str | None] = os.getenv("EXPORT_API_TOKEN") or None
 
 
 async def get_main_db_session(x_authorization: str | None = Header(default=None)) -> AsyncGenerator:
+    session = LazySession(MainSessionLocal)  # type: ignore
     try:
-        async with MainSessionLocal() as session:  # type: ignore
-            yield session
+        yield session
     except HTTPException:
-        session.rollback()  # type: ignore
+        await session.rollback()
         raise
     finally:
-        await session.close()  # type: ignore
+        await session.close()
+
+
+def verify_export_token(x_authorization: str | None = Header(default=None)) -> None:
+    if (
+        export_api_token is None
+        or x_authorization is None
+        or not hmac.compare_digest(x_authorization.encode(), f"Bearer {export_api_token}".encode())
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="ERROR.AUTH.UNAUTHORIZED",
+        )
 
 
 def get_ip_address(x_forwarded_for: str | None = Header(default=None)) -> str:
@@ -36,18 +55,87 @@ def get_ip_address(x_forwarded_for: str | None = Header(default=None)) -> str:
     return x_forwarded_for.split(",")[-2].strip()
 
 
+def rep_session(session_locals: List[sessionmaker]) -> LazySession:
+    return LazySession(
+        random.choice(session_locals),
+        release_after_statement=True,
+        begin_statements=[text("SET TRANSACTION READ ONLY")] if is_local else [],
+    )
+
+
 async def get_rep_db_session(x_authorization: str | None = Header(default=None)) -> AsyncGenerator:
-    current_session = random.choice(ReplicationSessionLocals)
+    session = rep_session(ReplicationSessionLocals)
+    try:
+        yield session
+    except HTTPException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+async def get_shard_main_db_session(
+    shard_key: int, x_authorization: str | None = Header(default=None)
+) -> AsyncGenerator:
+    session = LazySession(shard_for(shard_key).MainSessionLocal)  # type: ignore
     try:
-        async with current_session() as session:
-            if is_local:
-                await session.execute(text("SET TRANSACTION READ ONLY"))
-            yield session
+        yield session
     except HTTPException:
-        session.rollback()  # type: ignore
+        await session.rollback()
         raise
     finally:
-        await session.close()  # type: ignore
+        await session.close()
+
+
+async def get_shard_rep_db_session(
+    shard_key: int, x_authorization: str | None = Header(default=None)
+) -> AsyncGenerator:
+    session = rep_session(shard_for(shard_key).ReplicationSessionLocals)
+    try:
+        yield session
+    except HTTPException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+T = TypeVar("T")
+
+
+async def on_every_shard(fn: Callable[[Shard, LazySession], Awaitable[T]]) -> List[T]:
+    """Call `fn` with a replica session of every shard in parallel; results are in shard order."""
+
+    async def run(shard: Shard) -> T:
+        session = rep_session(shard.ReplicationSessionLocals)
+        try:
+            return await fn(shard, session)
+        finally:
+            await session.close()
+
+    return list(await asyncio.gather(*(run(shard) for shard in Shards)))
+
+
+async def scatter_gather(
+    query: Executable,
+    key: Callable[[Any], Any] | None = None,
+    reverse: bool = False,
+    limit: int | None = None,
+    scalars: bool = False,
+) -> List[Any]:
+    """
+    Run a read query on a replica of every shard in parallel and merge the results.
+    With `key`, each shard's rows must already be sorted by it (ORDER BY in `query`, `reverse`
+    for DESC) and the merged list keeps that order; `limit` cuts the merged list.
+    """
+
+    async def run(shard: Shard, session: LazySession) -> List[Any]:
+        result = await (session.scalars(query) if scalars else session.execute(query))
+        return list(result.all())
+
+    results = await on_every_shard(run)
+    merged = heapq.merge(*results, key=key, reverse=reverse) if key is not None else itertools.chain(*results)
+    return list(itertools.islice(merged, limit))
 
 
 class AioHttpClient:
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3.11
+###########################################################
+# middleware の前後比較 (1 プロセス = 1 worker 相当)
+# PYTHONPATH=. python benchmarks/bench_middleware.py
+###########################################################
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+from middleware import FastPathMiddleware
+
+origins: List[str] = [
+    "http://localhost:4200",
+    "https://*.kakeai.dev",
+]
+
+
+def add_routes(app: FastAPI) -> FastAPI:
+    @app.get("/api/hello")
+    async def hello():
+        return {"message": "Hello World"}
+
+    @app.get("/api/large")
+    async def large():
+        return [{"id": i, "name": f"organization {i}"} for i in range(500)]
+
+    return app
+
+
+def before() -> FastAPI:
+    app = add_routes(FastAPI())
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    return app
+
+
+def after() -> FastAPI:
+    app = add_routes(FastAPI())
+    app.add_middleware(FastPathMiddleware, allow_origins=origins, minimum_size=1000)
+    return app
+
+
+cases: Dict[str, Tuple[str, str, List[Tuple[bytes, bytes]]]] = {
+    "hello": ("GET", "/api/hello", [(b"accept-encoding", b"gzip, deflate, br")]),
+    "hello+origin": (
+        "GET",
+        "/api/hello",
+        [(b"accept-encoding", b"gzip, deflate, br"), (b"origin", b"http://localhost:4200")],
+    ),
+    "preflight": (
+        "OPTIONS",
+        "/api/hello",
+        [
+            (b"origin", b"http://localhost:4200"),
+            (b"access-control-request-method", b"GET"),
+            (b"access-control-request-headers", b"x-authorization"),
+        ],
+    ),
+    "large+gzip": ("GET", "/api/large", [(b"accept-encoding", b"gzip, deflate, br")]),
+}
+
+
+async def run(app: FastAPI, method: str, path: str, headers: List[Tuple[bytes, bytes]], requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), *headers],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int) -> None:
+    apps: Dict[str, Callable[[], FastAPI]] = {"before": before, "after": after}
+    print(f"{'case':<14}{'before req/s':>14}{'after req/s':>14}{'change':>10}")
+    for name, (method, path, headers) in cases.items():
+        result = {label: await run(factory(), method, path, headers, requests) for label, factory in apps.items()}
+        change = result["after"] / result["before"] - 1
+        print(f"{name:<14}{result['before']:>14.0f}{result['after']:>14.0f}{change:>+10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import logging
+import os
+from typing import Any, Dict, Final, List, Optional, Set, Type
+
+from fastapi.encoders import jsonable_encoder
+
+from api_service import on_every_shard
+from db import LazySession, Shard
+from delta_sync import settled_before, settled_mark
+from models.model_base import ModelBase, epoch_mark
+from models.models import Organization
+
+feed_poll_interval: Final[float] = float(os.getenv("FEED_POLL_INTERVAL_SECONDS", "1"))
+feed_batch_size: Final[int] = int(os.getenv("FEED_BATCH_SIZE", "500"))
+feed_max_pending: Final[int] = int(os.getenv("FEED_MAX_PENDING", "5000"))
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """
+    Pending changes of one client, coalesced by row id so a row changed several times
+    between two sends is delivered once with its latest state.
+    A client that falls more than `max_pending` rows behind is told to resync instead.
+    get() returns None once the subscriber is closed.
+    """
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._overflowed = False
+        self._closed = False
+        self._event = asyncio.Event()
+
+    def close(self) -> None:
+        self._closed = True
+        self._event.set()
+
+    def push(self, rows: List[Dict[str, Any]]) -> None:
+        if self._overflowed:
+            return
+        for row in rows:
+            self._pending.pop(row["id"], None)
+            self._pending[row["id"]] = row
+        if len(self._pending) > self.max_pending:
+            self._pending = {}
+            self._overflowed = True
+        self._event.set()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        await self._event.wait()
+        if self._closed:
+            return None
+        self._event.clear()
+        if self._overflowed:
+            self._overflowed = False
+            return {"type": "resync"}
+        rows, self._pending = list(self._pending.values()), {}
+        return {"type": "changes", "rows": rows}
+
+
+class ChangeFeed:
+    """
+    One poller per worker process for a ModelBase table. While anyone is subscribed it reads
+    rows past each shard's (updated_at, id) high-water mark from a replica and broadcasts them, so
+    replica load follows the rate of changes rather than the number of clients.
+    Like delta sync the mark only moves past rows older than the lookback margin; the rows
+    after it are scanned again and only broadcast when they differ from what was sent.
+    Deletes are not detected.
+    """
+
+    def __init__(self, model: Type[ModelBase], poll_interval: float, batch_size: int, max_pending: int) -> None:
+        self.model = model
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.subscribers: Set[Subscriber] = set()
+        # by shard index
+        self._marks: Dict[int, tuple[datetime.datetime, int]] = {}
+        # by shard index: id -> (updated_at, row) broadcast while still within the lookback margin
+        self._recent: Dict[int, Dict[int, tuple[datetime.datetime, Dict[str, Any]]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.max_pending)
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_forever())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def close_subscribers(self) -> None:
+        for subscriber in self.subscribers:
+            subscriber.close()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll_forever(self) -> None:
+        while True:
+            if self.subscribers:
+                try:
+                    await self._poll()
+                except Exception:
+                    logger.exception("change feed poll failed (%s)", self.model.__tablename__)  # type: ignore
+            else:
+                # new subscribers only want changes from the time they subscribe
+                self._marks = {}
+                self._recent = {}
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self) -> None:
+        await on_every_shard(self._poll_shard)
+
+    async def _poll_shard(self, shard: Shard, session: LazySession) -> None:
+        settled = await settled_before(session)
+        mark = self._marks.get(shard.index)
+        if mark is None:
+            row = (await session.execute(self.model.select_high_water_mark(settled))).first()
+            mark = (row.updated_at, row.id) if row is not None else epoch_mark
+        recent = self._recent.setdefault(shard.index, {})
+        position = mark
+        while True:
+            rows = (await session.scalars(self.model.select_changed_since(position, self.batch_size))).all()
+            if not rows:
+                break
+            mark = settled_mark(mark, rows, settled)
+            position = (rows[-1].updated_at, rows[-1].id)
+            changed = []
+            for row in rows:
+                data = jsonable_encoder(row.to_dict())
+                if row.id in recent and recent[row.id][1] == data:
+                    continue
+                recent[row.id] = (row.updated_at, data)
+                changed.append(data)
+            if changed:
+                self._broadcast(changed)
+            if len(rows) < self.batch_size:
+                break
+        self._marks[shard.index] = mark
+        # rows before the mark are never scanned again
+        self._recent[shard.index] = {id: entry for id, entry in recent.items() if entry[0] >= settled}
+
+    def _broadcast(self, rows: List[Dict[str, Any]]) -> None:
+        for subscriber in self.subscribers:
+            subscriber.push(rows)
+
+
+organization_feed = ChangeFeed(Organization, feed_poll_interval, feed_batch_size, feed_max_pending)
@@ -4,3 +4,8 @@ from typing import Final, Literal, cast
 
 class Constants:
     ENV: Final[Literal["local", "dev", "prod", "stg", "qa"]] = os.getenv("ENV")  # type: ignore
+    # same variable as gunicorn_conf.py: gunicorn kills a worker GRACEFUL_TIMEOUT seconds after SIGTERM
+    GRACEFUL_TIMEOUT: Final[int] = int(os.getenv("GRACEFUL_TIMEOUT", "120"))
+    # part of GRACEFUL_TIMEOUT kept for disposing pools and closing clients after the drain
+    DISPOSE_RESERVE: Final[int] = int(os.getenv("LIFECYCLE_DISPOSE_RESERVE_SECONDS", "10"))
+    DRAIN_TIMEOUT: Final[float] = float(max(GRACEFUL_TIMEOUT - DISPOSE_RESERVE, 1))
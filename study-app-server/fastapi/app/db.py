@@ -1,7 +1,10 @@
+import asyncio
+import json
 import os
-from typing import Final, List, cast
+from typing import Any, Callable, Dict, Final, List, Sequence, cast
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import Executable
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 db_main_host: Final[str] = cast(str, os.getenv("DB_HOST"))
@@ -10,6 +13,9 @@ db_name: Final[str] = cast(str, os.getenv("DB_NAME"))
 db_password: Final[str] = cast(str, os.getenv("DB_PASSWORD"))
 db_user: Final[str] = cast(str, os.getenv("DB_USER"))
 db_pool_size: Final[int] = int(os.environ["DB_POOL_SIZE"])
+db_max_overflow: Final[int] = 5
+db_pool_max_queue: Final[int] = int(os.getenv("ADMISSION_POOL_MAX_QUEUE", str((db_pool_size + db_max_overflow) * 2)))
+db_pool_max_wait: Final[float] = float(os.getenv("ADMISSION_POOL_MAX_WAIT_SECONDS", "0.5"))
 
 
 def db_uri(host: str, schema: str) -> str:
@@ -20,28 +26,209 @@ def db_uri(host: str, schema: str) -> str:
     )
 
 
-main_engine = create_async_engine(
-    db_uri(db_main_host, db_name),
-    pool_pre_ping=True,
-    pool_size=db_pool_size,
-    max_overflow=5,
-    pool_recycle=3600,
-    logging_name="<main>",
-    isolation_level="READ COMMITTED",
-)
-MainSessionLocal = sessionmaker(
-    autocommit=False, autoflush=False, bind=main_engine, class_=AsyncSession, expire_on_commit=False  # type: ignore
-)
-ReplicationSessionLocals = []
-
-for rep_hosts in db_rep_hosts:
+class ConcurrencyLimit:
+    """
+    Concurrency limit with a bounded wait queue.
+    acquire() waits at most `max_wait` seconds for a slot and returns False when the queue is
+    full or the wait crosses the threshold, so the caller can shed instead of piling up.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int, max_wait: float) -> None:
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        return True
+
+    async def acquire_unbounded(self) -> None:
+        await self._semaphore.acquire()
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class PoolSaturated(Exception):
+    """A pool stayed exhausted for longer than db_pool_max_wait; answered with 503 (admission.py)."""
+
+
+# one gate per engine, sized to its pool: waiting on the gate is waiting for a checkout
+pool_gates: Dict[AsyncEngine, ConcurrencyLimit] = {}
+
+
+def create_db_engine(host: str, logging_name: str) -> AsyncEngine:
     engine = create_async_engine(
-        db_uri(rep_hosts, db_name),
+        db_uri(host, db_name),
         pool_pre_ping=True,
         pool_size=db_pool_size,
-        max_overflow=5,
+        max_overflow=db_max_overflow,
         pool_recycle=3600,
-        logging_name="<replication>",
+        logging_name=logging_name,
         isolation_level="READ COMMITTED",
     )
-    ReplicationSessionLocals.append(sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession))  # type: ignore
+    pool_gates[engine] = ConcurrencyLimit(db_pool_size + db_max_overflow, db_pool_max_queue, db_pool_max_wait)
+    return engine
+
+
+def create_sessionmaker(engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(
+        autocommit=False, autoflush=False, bind=engine, class_=AsyncSession, expire_on_commit=False  # type: ignore
+    )
+
+
+main_engine = create_db_engine(db_main_host, "<main>")
+MainSessionLocal = create_sessionmaker(main_engine)
+ReplicationEngines = [create_db_engine(rep_host, "<replication>") for rep_host in db_rep_hosts]
+ReplicationSessionLocals = [create_sessionmaker(engine) for engine in ReplicationEngines]
+
+
+class Shard:
+    """One primary and its replicas holding a slice of the sharded tables."""
+
+    def __init__(self, index: int, main_engine: AsyncEngine, rep_engines: List[AsyncEngine]) -> None:
+        self.index = index
+        self.main_engine = main_engine
+        self.rep_engines = rep_engines
+        self.MainSessionLocal = create_sessionmaker(main_engine)
+        self.ReplicationSessionLocals = [create_sessionmaker(engine) for engine in rep_engines]
+
+
+def load_shards(value: str) -> List[Dict[str, Any]]:
+    shards = json.loads(value or "[]")
+    if not isinstance(shards, list):
+        raise ValueError("DB_SHARDS must be a list")
+    for index, shard in enumerate(shards):
+        if not isinstance(shard, dict) or not isinstance(shard.get("host"), str) or not shard["host"]:
+            raise ValueError(f"DB_SHARDS[{index}]: host is required")
+        replications = shard.get("replications")
+        if not isinstance(replications, list) or not replications:
+            raise ValueError(f"DB_SHARDS[{index}]: replications must be a non-empty list of hosts")
+    return shards
+
+
+# DB_SHARDS='[{"host": "db-0", "replications": ["db-0-r1"]}, {"host": "db-1", "replications": ["db-1-r1"]}]'
+# without it the single DB_HOST / DB_HOST_REPLICATIONS pair is shard 0
+db_shards: Final[List[Dict[str, Any]]] = load_shards(os.getenv("DB_SHARDS") or "[]")
+
+# Tables split across Shards by id (see shard_for); every other table is only used on DB_HOST.
+# Tombstones are written by the sharded tables' triggers, so they live on the same shard as the row.
+# Shard i must hand out ids with id % len(Shards) == i (auto_increment_increment = len(Shards)
+# and a matching auto_increment_offset) so that ids are unique and shard_for(id) finds the row.
+sharded_tables: Final[List[str]] = ["organizations", "tombstones"]
+
+if db_shards:
+    Shards = [
+        Shard(
+            index,
+            create_db_engine(shard["host"], f"<shard{index}:main>"),
+            [create_db_engine(rep_host, f"<shard{index}:replication>") for rep_host in shard["replications"]],
+        )
+        for index, shard in enumerate(db_shards)
+    ]
+else:
+    Shards = [Shard(0, main_engine, ReplicationEngines)]
+
+
+def shard_for(shard_key: int) -> Shard:
+    """
+    Shard holding the rows of `shard_key` (the id of a row of a sharded table).
+    Plain modulo: adding shards moves keys, so the shard list is fixed once data is written.
+    """
+    return Shards[shard_key % len(Shards)]
+
+
+def all_engines() -> List[AsyncEngine]:
+    engines = [main_engine, *ReplicationEngines]
+    for shard in Shards:
+        engines.extend(engine for engine in [shard.main_engine, *shard.rep_engines] if engine not in engines)
+    return engines
+
+
+class LazySession:
+    """
+    AsyncSession proxy that is created on the first statement, so a handler that returns
+    before touching the DB never checks out a connection.
+    With `release_after_statement` (read-only use only) the transaction is ended right after
+    each execute/scalar/scalars/get and the connection goes back to the pool while the
+    handler does non-DB work. Each of those statements first passes the engine's pool gate
+    and raises PoolSaturated when the pool stays exhausted.
+    `begin_statements` are run at the start of every transaction.
+    Anything else (add, commit, stream, ...) is delegated to the underlying AsyncSession.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        release_after_statement: bool = False,
+        begin_statements: Sequence[Executable] = (),
+    ) -> None:
+        self._session_factory = session_factory
+        self._release_after_statement = release_after_statement
+        self._begin_statements = begin_statements
+        self._session: AsyncSession | None = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    async def _run(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        session = self.session
+        gate = pool_gates.get(session.bind) if self._release_after_statement else None  # type: ignore
+        if gate is not None and not await gate.acquire():
+            raise PoolSaturated()
+        try:
+            if not session.in_transaction():
+                for statement in self._begin_statements:
+                    await session.execute(statement)
+            try:
+                result = await getattr(session, method)(*args, **kwargs)
+            except BaseException:
+                if self._release_after_statement:
+                    await session.rollback()
+                raise
+            if self._release_after_statement:
+                await session.commit()
+            return result
+        finally:
+            if gate is not None:
+                gate.release()
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("execute", *args, **kwargs)
+
+    async def scalar(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("scalar", *args, **kwargs)
+
+    async def scalars(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("scalars", *args, **kwargs)
+
+    async def get(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._run("get", *args, **kwargs)
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
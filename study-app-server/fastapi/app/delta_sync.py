@@ -0,0 +1,193 @@
+#!/usr/bin/env python3.11
+"""
+Cursor-based delta sync of sharded ModelBase tables.
+
+Deletes are read from tombstones, which are kept for `sync_tombstone_retention`; run the
+prune job daily on every shard primary:
+
+    python delta_sync.py prune-tombstones
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import json
+import os
+from typing import Any, Dict, Final, List, Sequence, Type
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, select
+
+from api_service import on_every_shard
+from db import LazySession, Shard, Shards, all_engines
+from models.model_base import ModelBase, epoch_mark
+from models.models import Tombstone
+
+sync_max_limit: Final[int] = 1000
+# rows newer than this (by the database clock) may still be joined by rows that sort before
+# them, e.g. from a replica running behind or a transaction committing late; cursors are only
+# moved past older rows and newer ones are sent again. Keep it above replica lag + the
+# longest write transaction.
+sync_lookback: Final[datetime.timedelta] = datetime.timedelta(seconds=float(os.getenv("SYNC_LOOKBACK_SECONDS", "10")))
+# tombstones older than this are pruned, so cursors whose tombstones mark is older are refused
+sync_tombstone_retention: Final[datetime.timedelta] = datetime.timedelta(
+    days=float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+)
+tombstone_prune_batch_size: Final[int] = 10000
+
+Mark = tuple[datetime.datetime, int]
+# (rows mark, tombstones mark) of one shard
+Position = tuple[Mark, Mark]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(positions: Sequence[Position]) -> str:
+    """One position per shard, in shard order."""
+    payload = [[[mark[0].isoformat(), mark[1]] for mark in position] for position in positions]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Position]:
+    try:
+        positions = []
+        for (rows_at, rows_id), (tombstones_at, tombstones_id) in json.loads(base64.urlsafe_b64decode(cursor)):
+            positions.append(
+                (
+                    (datetime.datetime.fromisoformat(rows_at), int(rows_id)),
+                    (datetime.datetime.fromisoformat(tombstones_at), int(tombstones_id)),
+                )
+            )
+        return positions
+    except (ValueError, TypeError):
+        raise InvalidCursor("ERROR.SYNC.INVALID_CURSOR")
+
+
+def settled_mark(mark: Mark, rows: Sequence[ModelBase], settled: datetime.datetime) -> Mark:
+    """`mark` moved past the leading `rows` (ordered by updated_at, id) older than `settled`."""
+    for row in rows:
+        if row.updated_at >= settled:
+            break
+        mark = (row.updated_at, row.id)
+    return mark
+
+
+async def database_now(session: LazySession) -> datetime.datetime:
+    return await session.scalar(select(func.current_timestamp()))
+
+
+async def settled_before(session: LazySession) -> datetime.datetime:
+    return await database_now(session) - sync_lookback
+
+
+def check_position(position: Position, now: datetime.datetime) -> None:
+    """Tombstones after a mark older than the retention window may be gone: the client must resync."""
+    if position[1][0] < now - sync_tombstone_retention:
+        raise InvalidCursor("ERROR.SYNC.INVALID_CURSOR")
+
+
+async def changes_since(model: Type[ModelBase], cursor: str | None, limit: int) -> Dict[str, Any]:
+    """
+    Rows of `model` created or updated, and ids deleted, after `cursor`, from every shard.
+    Without a cursor this is the first page of a full sync; deletes that happened before it are skipped.
+    A cursor from a different number of shards, or older than the tombstone retention, is
+    invalid and the client has to sync from scratch.
+    Changes within `sync_lookback` are returned but stay after the cursor, so clients receive
+    them again and must apply changes idempotently.
+    `has_more` tells the client to call again right away with the returned cursor.
+    """
+    positions: List[Position | None] = [None] * len(Shards)
+    if cursor is not None:
+        positions = [*decode_cursor(cursor)]
+        if len(positions) != len(Shards):
+            raise InvalidCursor("ERROR.SYNC.INVALID_CURSOR")
+
+    async def shard_changes(shard: Shard, session: LazySession) -> Dict[str, Any]:
+        return await _shard_changes(session, model, positions[shard.index], limit)
+
+    pages = await on_every_shard(shard_changes)
+    return {
+        "upserts": [row for page in pages for row in page["upserts"]],
+        "deletes": [row_id for page in pages for row_id in page["deletes"]],
+        "cursor": encode_cursor([page["position"] for page in pages]),
+        "has_more": any(page["has_more"] for page in pages),
+    }
+
+
+async def _shard_changes(
+    session: LazySession, model: Type[ModelBase], position: Position | None, limit: int
+) -> Dict[str, Any]:
+    table_name: str = model.__tablename__  # type: ignore
+    now = await database_now(session)
+    settled = now - sync_lookback
+    if position is None:
+        rows_mark, tombstones_mark = epoch_mark, (settled, 0)
+    else:
+        check_position(position, now)
+        rows_mark, tombstones_mark = position
+
+    rows = (await session.scalars(model.select_changed_since(rows_mark, limit))).all()
+    tombstones = (
+        await session.scalars(
+            Tombstone.select_changed_since(tombstones_mark, limit).where(Tombstone.table_name == table_name)
+        )
+    ).all()
+    next_rows_mark = settled_mark(rows_mark, rows, settled)
+    next_tombstones_mark = settled_mark(tombstones_mark, tombstones, settled)
+    if len(tombstones) < limit:
+        # every tombstone before `settled` has been read: keep the mark recent even without deletes,
+        # so only clients that stop syncing fall out of the retention window
+        next_tombstones_mark = max(next_tombstones_mark, (settled, 0))
+    return {
+        "upserts": jsonable_encoder([row.to_dict() for row in rows]),
+        "deletes": [tombstone.row_id for tombstone in tombstones],
+        "position": (next_rows_mark, next_tombstones_mark),
+        # a full page that is still within the lookback would be fetched again unchanged
+        "has_more": (len(rows) == limit and next_rows_mark != rows_mark)
+        or (len(tombstones) == limit and next_tombstones_mark != tombstones_mark),
+    }
+
+
+async def prune_tombstones(retention: datetime.timedelta = sync_tombstone_retention) -> int:
+    """Delete tombstones older than `retention` on every shard primary, in batches. Returns the number deleted."""
+    deleted = 0
+    for shard in Shards:
+        async with shard.MainSessionLocal() as session:
+            cutoff = await session.scalar(select(func.current_timestamp())) - retention
+            for table_name in (await session.scalars(select(Tombstone.table_name).distinct())).all():
+                # (table_name, updated_at) is a range on ix_tombstones_table_name_updated_at_id
+                query = (
+                    delete(Tombstone)
+                    .where(Tombstone.table_name == table_name, Tombstone.updated_at < cutoff)
+                    .with_dialect_options(mysql_limit=tombstone_prune_batch_size)
+                )
+                while True:
+                    result = await session.execute(query)
+                    await session.commit()
+                    deleted += result.rowcount
+                    if result.rowcount < tombstone_prune_batch_size:
+                        break
+    return deleted
+
+
+async def _prune(retention: datetime.timedelta) -> None:
+    try:
+        print(f"deleted {await prune_tombstones(retention)} tombstone(s)")
+    finally:
+        for engine in all_engines():
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delta sync maintenance")
+    parser.add_argument("command", choices=["prune-tombstones"])
+    parser.add_argument("--retention-days", type=float, default=sync_tombstone_retention.total_seconds() / 86400)
+    args = parser.parse_args()
+
+    asyncio.run(_prune(datetime.timedelta(days=args.retention_days)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3.11
+"""
+Bulk export of ModelBase tables to CSV or Parquet.
+Only tables listed in `exportable_tables` can be exported.
+
+Rows are read from a replica through a server-side cursor in fixed-size chunks and each
+chunk is encoded with pandas as soon as it arrives, so memory stays constant regardless
+of the table size. Sharded tables are read from each shard in turn, so rows are in primary
+key order per shard. Used by the /api/export endpoint and runnable as a CLI:
+
+    python export.py organizations --format parquet --output organizations.parquet
+"""
+import argparse
+import asyncio
+import datetime
+import decimal
+import io
+import os
+import random
+import zlib
+from typing import AsyncGenerator, Dict, Final, List, Literal, cast
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Column, Table, select
+from starlette.concurrency import run_in_threadpool
+
+from db import ReplicationEngines, Shards, all_engines, pool_gates, sharded_tables
+from models import models  # noqa: F401  registers the tables on ModelBase.metadata
+from models.model_base import ModelBase
+
+export_chunk_size: Final[int] = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))
+
+# tables are opt-in: new tables (and internal ones such as tombstones) are not exported by default
+exportable_tables: Final[List[str]] = ["organizations"]
+
+ExportFormat = Literal["csv", "parquet"]
+csv_compressions: Final[List[str]] = ["gzip"]
+parquet_compressions: Final[List[str]] = ["snappy", "gzip", "zstd"]
+
+
+class ExportError(ValueError):
+    pass
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, columns: List[str], compression: str | None) -> None:
+        if compression is not None and compression not in csv_compressions:
+            raise ExportError("ERROR.EXPORT.INVALID_COMPRESSION")
+        self.columns = columns
+        self._header = True
+        # wbits=31: gzip container, one member spanning every chunk
+        self._compressor = zlib.compressobj(wbits=31) if compression == "gzip" else None
+        if self._compressor is not None:
+            self.media_type = "application/gzip"
+            self.extension = "csv.gz"
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        data = frame.to_csv(index=False, header=self._header).encode("utf-8")
+        self._header = False
+        return self._compressor.compress(data) if self._compressor is not None else data
+
+    def finish(self) -> bytes:
+        data = b""
+        if self._header:
+            data = pd.DataFrame(columns=self.columns).to_csv(index=False).encode("utf-8")
+        return self._compressor.compress(data) + self._compressor.flush() if self._compressor is not None else data
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what has been written so far; tell() keeps counting across drains."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# Arrow types by the Python type of the SQLAlchemy column type; anything else is exported as text
+arrow_types: Final[Dict[type, pa.DataType]] = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    # MySQL drivers return naive datetimes in the session time zone
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64("us"),
+}
+
+
+def arrow_field(column: Column) -> pa.Field:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = str
+    if python_type is decimal.Decimal:
+        precision = getattr(column.type, "precision", None)
+        scale = getattr(column.type, "scale", None) or 0
+        arrow_type = pa.decimal128(precision, scale) if precision is not None else pa.string()
+    else:
+        arrow_type = arrow_types.get(python_type, pa.string())
+    return pa.field(column.name, arrow_type)
+
+
+class ParquetEncoder:
+    """
+    Every chunk becomes one row group of a single Parquet file.
+    The schema comes from the column types, so a chunk where a column is all null encodes
+    the same way as any other.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, columns: List[Column], compression: str | None) -> None:
+        if compression is not None and compression not in parquet_compressions:
+            raise ExportError("ERROR.EXPORT.INVALID_COMPRESSION")
+        self.schema = pa.schema([arrow_field(column) for column in columns])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema, compression=compression or "none")
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def export_table(name: str) -> Table:
+    if name not in exportable_tables:
+        raise ExportError("ERROR.EXPORT.UNKNOWN_TABLE")
+    return ModelBase.metadata.tables[name]
+
+
+def export_columns(table: Table, names: List[str] | None) -> List[Column]:
+    if not names:
+        return list(table.columns)
+    unknown = [name for name in names if name not in table.columns]
+    if unknown:
+        raise ExportError("ERROR.EXPORT.UNKNOWN_COLUMN")
+    return [table.columns[name] for name in names]
+
+
+def export_encoder(format: str, columns: List[Column], compression: str | None) -> CsvEncoder | ParquetEncoder:
+    if format == "csv":
+        return CsvEncoder([column.name for column in columns], compression)
+    if format == "parquet":
+        return ParquetEncoder(columns, compression)
+    raise ExportError("ERROR.EXPORT.INVALID_FORMAT")
+
+
+async def iter_frames(table: Table, columns: List[Column], chunk_size: int) -> AsyncGenerator[pd.DataFrame, None]:
+    if table.name in sharded_tables:
+        engines = [random.choice(shard.rep_engines) for shard in Shards]
+    else:
+        engines = [random.choice(ReplicationEngines)]
+    query = select(*columns).order_by(*table.primary_key.columns).execution_options(yield_per=chunk_size)
+    for engine in engines:
+        # an export holds its connection for the whole stream: it takes a pool slot like any
+        # statement, but waits for one instead of failing a response that has already started
+        gate = pool_gates[engine]
+        await gate.acquire_unbounded()
+        try:
+            async with engine.connect() as connection:
+                result = await connection.stream(query)
+                async for rows in result.partitions(chunk_size):
+                    yield pd.DataFrame.from_records(rows, columns=[column.name for column in columns])
+        finally:
+            gate.release()
+
+
+async def export_stream(
+    table: Table, columns: List[Column], encoder: CsvEncoder | ParquetEncoder, chunk_size: int = export_chunk_size
+) -> AsyncGenerator[bytes, None]:
+    async for frame in iter_frames(table, columns, chunk_size):
+        data = await run_in_threadpool(encoder.encode, frame)
+        if data:
+            yield data
+    yield await run_in_threadpool(encoder.finish)
+
+
+async def export_to_file(
+    table_name: str,
+    format: ExportFormat,
+    output: str,
+    columns: List[str] | None = None,
+    compression: str | None = None,
+    chunk_size: int = export_chunk_size,
+) -> None:
+    table = export_table(table_name)
+    selected = export_columns(table, columns)
+    encoder = export_encoder(format, selected, compression)
+    try:
+        with open(output, "wb") as file:
+            async for data in export_stream(table, selected, encoder, chunk_size):
+                file.write(data)
+    finally:
+        for engine in all_engines():
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a table from a replica to CSV or Parquet")
+    parser.add_argument("table", choices=exportable_tables)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--columns", help="comma separated column names (default: all)")
+    parser.add_argument("--compression", help=f"csv: {csv_compressions}, parquet: {parquet_compressions}")
+    parser.add_argument("--chunk-size", type=int, default=export_chunk_size)
+    args = parser.parse_args()
+
+    asyncio.run(
+        export_to_file(
+            args.table,
+            cast(ExportFormat, args.format),
+            args.output,
+            columns=args.columns.split(",") if args.columns else None,
+            compression=args.compression,
+            chunk_size=args.chunk_size,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api_service import get_aiohttp_client
+from change_feed import organization_feed
+from constants import Constants
+from db import all_engines
+
+# gunicorn routes this logger to its error log, so the exit report is visible in every environment
+logger = logging.getLogger("uvicorn.error")
+
+
+def pool_snapshot() -> List[Dict[str, Any]]:
+    return [
+        {
+            "host": engine.url.host,
+            "logging_name": engine.sync_engine.logging_name,
+            "status": engine.pool.status(),
+        }
+        for engine in all_engines()
+    ]
+
+
+class Lifecycle:
+    """
+    Worker shutdown in order: stop accepting work, drain in-flight requests within
+    Constants.DRAIN_TIMEOUT, dispose every engine's pool, close outbound clients.
+    begin_drain() is called as soon as the server decides to exit (see worker.py);
+    shutdown() runs from the application's shutdown event.
+    """
+
+    def __init__(self, drain_timeout: float) -> None:
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.drain_started: float | None = None
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def begin_drain(self) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        self.drain_started = time.monotonic()
+        logger.info("draining %d in-flight request(s)", self.in_flight)
+        # feed streams never finish on their own
+        organization_feed.close_subscribers()
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def shutdown(self) -> None:
+        self.begin_drain()
+        assert self.drain_started is not None
+        remaining = self.drain_timeout - (time.monotonic() - self.drain_started)
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(remaining, 0))
+        except asyncio.TimeoutError:
+            logger.warning("drain timed out with %d request(s) in flight", self.in_flight)
+
+        await organization_feed.stop()
+        await get_aiohttp_client.close()
+        snapshot = pool_snapshot()
+        for engine in all_engines():
+            await engine.dispose()
+        logger.info("pool snapshot on exit: %s", json.dumps(snapshot))
+
+
+lifecycle = Lifecycle(Constants.DRAIN_TIMEOUT)
+
+
+class LifecycleMiddleware:
+    """Counts in-flight HTTP requests and turns new work away while draining."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.app(scope, receive, send)
+            return
+        if lifecycle.draining:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1012})
+                return
+            response = JSONResponse(
+                {"detail": "ERROR.LIFECYCLE.DRAINING"},
+                status_code=503,
+                headers={"Retry-After": "1", "Connection": "close"},
+            )
+            await response(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lifecycle.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lifecycle.request_finished()
@@ -1,14 +1,22 @@
+import asyncio
+import json
 import logging as baseLogging
 import os
-from typing import List
+from typing import AsyncGenerator, List
 
 import coloredlogs
-from fastapi import FastAPI,Depends
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from api_service import get_aiohttp_client, get_main_db_session, get_rep_db_session
+from fastapi import FastAPI,Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from admission import AdmissionControlMiddleware, pool_saturated_handler
+from change_feed import organization_feed
+from delta_sync import InvalidCursor, changes_since, sync_max_limit
+from lifecycle import LifecycleMiddleware, lifecycle
+from middleware import FastPathMiddleware
+from search import search_max_limit, search_organizations
+from export import ExportError, ExportFormat, export_columns, export_encoder, export_stream, export_table
+from api_service import get_aiohttp_client, scatter_gather, verify_export_token
+from db import PoolSaturated
 from models.models import Organization
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import  select
 is_local = os.getenv("ENV") == "local"
 
@@ -26,14 +34,11 @@ origins: List[str] = [
     "https://*.kakeai.dev",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# added first so it runs innermost: shed responses still get CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(FastPathMiddleware, allow_origins=origins, minimum_size=1000)
+app.add_middleware(LifecycleMiddleware)
+app.add_exception_handler(PoolSaturated, pool_saturated_handler)
 
 
 
@@ -44,7 +49,7 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
-    await get_aiohttp_client.close()
+    await lifecycle.shutdown()
 
 
 @app.get("/api/hello")
@@ -52,6 +57,99 @@ async def root():
     return {"message": "Hello World"}
 
 @app.get("/api/organizations")
-async def organizations(session: AsyncSession = Depends(get_rep_db_session),) -> List[str]:
-    query = select(Organization)
-    return [x.name for x in (await session.execute(query)).scalars().all()]
\ No newline at end of file
+async def organizations() -> List[str]:
+    query = select(Organization).order_by(Organization.id)
+    return [x.name for x in await scatter_gather(query, key=lambda x: x.id, scalars=True)]
+
+
+@app.get("/api/organizations/search")
+async def organizations_search(
+    # at least one non-whitespace character: the term is stripped before searching
+    q: str = Query(min_length=1, max_length=60, pattern=r"\S"),
+    limit: int = Query(default=20, ge=1, le=search_max_limit),
+    offset: int = Query(default=0, ge=0, le=1000),
+) -> dict:
+    return await search_organizations(q, limit, offset)
+
+
+@app.get("/api/organizations/changes")
+async def organizations_changes(
+    since: str | None = None,
+    limit: int = Query(default=100, ge=1, le=sync_max_limit),
+) -> dict:
+    try:
+        return await changes_since(Organization, since, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.websocket("/api/organizations/feed")
+async def organizations_feed(websocket: WebSocket):
+    await websocket.accept()
+    subscriber = organization_feed.subscribe()
+
+    async def send_changes() -> None:
+        while (message := await subscriber.get()) is not None:
+            await websocket.send_json(message)
+        # 1012: service restart
+        await websocket.close(code=1012)
+
+    async def receive_until_disconnect() -> None:
+        # clients send nothing; reading is how a disconnect is noticed while no changes arrive
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send_changes()), asyncio.create_task(receive_until_disconnect())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        organization_feed.unsubscribe(subscriber)
+
+
+@app.get("/api/organizations/feed/sse")
+async def organizations_feed_sse() -> StreamingResponse:
+    async def events() -> AsyncGenerator[str, None]:
+        subscriber = organization_feed.subscribe()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            organization_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/export/{table_name}", dependencies=[Depends(verify_export_token)])
+async def export(
+    table_name: str,
+    format: ExportFormat = "csv",
+    columns: str | None = None,
+    compression: str | None = None,
+) -> StreamingResponse:
+    try:
+        table = export_table(table_name)
+        selected = export_columns(table, columns.split(",") if columns else None)
+        encoder = export_encoder(format, selected, compression)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export_stream(table, selected, encoder),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{encoder.extension}"'},
+    )
@@ -0,0 +1,189 @@
+import zlib
+from typing import Final, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+cors_allow_methods: Final[bytes] = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+cors_max_age: Final[bytes] = b"600"
+
+# bodies of these types are already compressed or must reach the client as soon as they are sent
+gzip_skip_content_types: Final[Tuple[bytes, ...]] = (
+    b"text/event-stream",
+    b"application/gzip",
+    b"application/zip",
+    b"application/vnd.apache.parquet",
+    b"image/",
+    b"audio/",
+    b"video/",
+)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _header(headers: Sequence[Tuple[bytes, bytes]], name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
+
+
+class FastPathMiddleware:
+    """
+    CORS and gzip in one pure ASGI layer.
+
+    - Requests without an Origin header that don't accept gzip are passed straight through.
+    - Preflights are answered here from a precomputed header table and never reach the router.
+    - Allowed origins are compared literally, like Starlette's CORSMiddleware `allow_origins`.
+    - Bodies sent in one message below `minimum_size`, already encoded bodies and
+      streams/compressed media (gzip_skip_content_types) are not compressed.
+    - Everything else is gzip-compressed chunk by chunk as the app sends it; the whole
+      body is never buffered.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        allow_origins: Sequence[str],
+        minimum_size: int = 1000,
+        compresslevel: int = 6,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.allow_origins = {origin.encode() for origin in allow_origins}
+        self.preflight_headers: Headers = [
+            (b"access-control-allow-methods", cors_allow_methods),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-max-age", cors_max_age),
+            (b"vary", b"Origin"),
+            (b"content-length", b"2"),
+            (b"content-type", b"text/plain; charset=utf-8"),
+        ]
+
+    def is_allowed_origin(self, origin: bytes) -> bool:
+        return origin in self.allow_origins
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        accepts_gzip = False
+        request_method = None
+        request_headers = None
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value
+            elif key == b"accept-encoding":
+                accepts_gzip = b"gzip" in value
+            elif key == b"access-control-request-method":
+                request_method = value
+            elif key == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is not None and scope["method"] == "OPTIONS" and request_method is not None:
+            await self.preflight(origin, request_headers, send)
+            return
+        if origin is not None and not self.is_allowed_origin(origin):
+            origin = None
+        if origin is None and not accepts_gzip:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self, origin, accepts_gzip, send)(scope, receive)
+
+    async def preflight(self, origin: bytes, request_headers: bytes | None, send: Send) -> None:
+        if not self.is_allowed_origin(origin):
+            body = b"Disallowed CORS origin"
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 400,
+                    "headers": [(b"content-length", str(len(body)).encode()), (b"vary", b"Origin")],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+        headers = [(b"access-control-allow-origin", origin), *self.preflight_headers]
+        if request_headers is not None:
+            headers.append((b"access-control-allow-headers", request_headers))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"OK"})
+
+
+class _Responder:
+    def __init__(self, middleware: FastPathMiddleware, origin: bytes | None, accepts_gzip: bool, send: Send) -> None:
+        self.middleware = middleware
+        self.origin = origin
+        self.accepts_gzip = accepts_gzip
+        self.send = send
+        self.start: Message | None = None
+        self.compressor = None
+
+    async def __call__(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.send_wrapper)
+
+    async def send_wrapper(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers: Headers = list(message.get("headers", []))
+            if self.origin is not None:
+                # replaces a value set by the app, as Starlette's CORSMiddleware does
+                headers = _set_header(headers, b"access-control-allow-origin", self.origin)
+                headers = _set_header(headers, b"access-control-allow-credentials", b"true")
+                headers = _add_vary(headers, b"Origin")
+            message = {**message, "headers": headers}
+            if not self.accepts_gzip or not self.compressible(headers):
+                self.accepts_gzip = False
+                await self.send(message)
+            else:
+                # decided on the first body message, once we know whether the body is small
+                self.start = message
+            return
+
+        if message["type"] != "http.response.body" or not self.accepts_gzip:
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.accepts_gzip = False
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = [(key, value) for key, value in start["headers"] if key != b"content-length"]
+            headers.append((b"content-encoding", b"gzip"))
+            headers = _add_vary(headers, b"Accept-Encoding")
+            self.compressor = zlib.compressobj(self.middleware.compresslevel, zlib.DEFLATED, 31)
+            await self.send({**start, "headers": headers})
+
+        assert self.compressor is not None
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    @staticmethod
+    def compressible(headers: Headers) -> bool:
+        if _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = _header(headers, b"content-type") or b""
+        return not content_type.startswith(gzip_skip_content_types)
+
+
+def _set_header(headers: Headers, name: bytes, value: bytes) -> Headers:
+    headers = [(key, current) for key, current in headers if key != name]
+    headers.append((name, value))
+    return headers
+
+
+def _add_vary(headers: Headers, value: bytes) -> Headers:
+    for index, (key, current) in enumerate(headers):
+        if key == b"vary":
+            headers[index] = (key, current + b", " + value)
+            return headers
+    headers.append((b"vary", value))
+    return headers
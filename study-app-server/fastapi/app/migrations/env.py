@@ -5,8 +5,9 @@ from sqlalchemy import engine_from_config
 
 from models.model_base import ModelBase
 
+import json
 import os
-from typing import cast
+from typing import List, cast
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -31,6 +32,8 @@ DB_HOST: str = cast(str, os.getenv("DB_HOST"))
 DB_USER: str = cast(str, os.getenv("DB_USER"))
 DB_PASSWORD: str = cast(str, os.getenv("DB_PASSWORD"))
 DB_NAME: str = cast(str, os.getenv("DB_NAME"))
+# every shard primary gets the same schema (see DB_SHARDS in db.py)
+DB_SHARD_HOSTS: List[str] = [shard["host"] for shard in json.loads(os.getenv("DB_SHARDS") or "[]")]
 
 
 def run_migrations_offline() -> None:
@@ -59,17 +62,20 @@ def run_migrations_offline() -> None:
 
 def run_migrations_online():
     section = config.config_ini_section
-    config.set_section_option(section, "DB_HOST", DB_HOST)
     config.set_section_option(section, "DB_USER", DB_USER)
     config.set_section_option(section, "DB_PASSWORD", DB_PASSWORD)
     config.set_section_option(section, "DB_NAME", DB_NAME)
-    engine = engine_from_config(config.get_section(section), prefix="sqlalchemy.")
 
-    with engine.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+    for host in dict.fromkeys([DB_HOST, *DB_SHARD_HOSTS]):
+        config.set_section_option(section, "DB_HOST", host)
+        engine = engine_from_config(config.get_section(section), prefix="sqlalchemy.")
 
-        with context.begin_transaction():
-            context.run_migrations()
+        with engine.connect() as connection:
+            context.configure(connection=connection, target_metadata=target_metadata)
+
+            with context.begin_transaction():
+                context.run_migrations()
+        engine.dispose()
 
 
 if context.is_offline_mode():
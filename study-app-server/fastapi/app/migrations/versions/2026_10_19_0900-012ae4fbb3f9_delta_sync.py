@@ -0,0 +1,52 @@
+"""delta sync
+
+Revision ID: 012ae4fbb3f9
+Revises: 5c1f2a49cdf2
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012ae4fbb3f9'
+down_revision = '5c1f2a49cdf2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # updates made by any client (ORM, raw SQL, console) move updated_at and so the sync cursor
+    op.alter_column('organizations', 'updated_at',
+               existing_type=sa.TIMESTAMP(timezone=True),
+               server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+               nullable=False,
+               existing_comment='最終更新日時')
+    op.create_index('ix_organizations_updated_at_id', 'organizations', ['updated_at', 'id'], unique=False)
+    op.create_table('tombstones',
+    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('row_id', sa.INTEGER(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False, comment='登録日時'),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=False, comment='最終更新日時'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_table_name_updated_at_id', 'tombstones', ['table_name', 'updated_at', 'id'], unique=False)
+    # deletes made by any client (ORM, raw SQL, console) leave a tombstone
+    op.execute(
+        "CREATE TRIGGER organizations_after_delete AFTER DELETE ON organizations FOR EACH ROW "
+        "INSERT INTO tombstones (table_name, row_id) VALUES ('organizations', OLD.id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS organizations_after_delete")
+    op.drop_index('ix_tombstones_table_name_updated_at_id', table_name='tombstones')
+    op.drop_table('tombstones')
+    op.drop_index('ix_organizations_updated_at_id', table_name='organizations')
+    op.alter_column('organizations', 'updated_at',
+               existing_type=sa.TIMESTAMP(timezone=True),
+               server_default=sa.text('CURRENT_TIMESTAMP'),
+               nullable=False,
+               existing_comment='最終更新日時')
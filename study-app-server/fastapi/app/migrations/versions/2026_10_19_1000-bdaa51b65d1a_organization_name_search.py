@@ -0,0 +1,31 @@
+"""organization name search
+
+Revision ID: bdaa51b65d1a
+Revises: 012ae4fbb3f9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bdaa51b65d1a'
+down_revision = '012ae4fbb3f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_organizations_name', 'organizations', ['name'], unique=False)
+    # with the ngram parser any token containing a stopword (e.g. "a") is dropped, so build the index without them
+    op.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    op.create_index(
+        'ft_organizations_name', 'organizations', ['name'], unique=False,
+        mysql_prefix='FULLTEXT', mysql_with_parser='ngram',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ft_organizations_name', table_name='organizations')
+    op.drop_index('ix_organizations_name', table_name='organizations')
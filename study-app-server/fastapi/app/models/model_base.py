@@ -1,6 +1,7 @@
 import datetime
+from typing import Any, Dict, Final
 
-from sqlalchemy import INTEGER, TIMESTAMP, ColumnElement, MetaData, func, select
+from sqlalchemy import INTEGER, TIMESTAMP, ColumnElement, MetaData, Select, and_, func, inspect, or_, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.declarative import as_declarative
 from sqlalchemy.orm import Mapped, mapped_column
@@ -13,6 +14,9 @@ timestamp = Annotated[
     mapped_column(nullable=False, server_default=func.CURRENT_TIMESTAMP()),
 ]
 
+# TIMESTAMP columns start at 1970-01-01 00:00:01, so this (updated_at, id) mark is before every row
+epoch_mark: Final[tuple[datetime.datetime, int]] = (datetime.datetime(1970, 1, 1), 0)
+
 
 @as_declarative()
 class ModelBase:
@@ -32,9 +36,35 @@ class ModelBase:
         "updated_at",
         TIMESTAMP(timezone=True),
         onupdate=current_timestamp(),
+        # also maintained by MySQL, so updates made outside the ORM move delta-sync cursors too
+        server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
         nullable=False,
         comment="最終更新日時",
         default=current_timestamp(),
     )
 
     metadata = MetaData()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {column.key: getattr(self, column.key) for column in inspect(self).mapper.column_attrs}
+
+    @classmethod
+    def select_changed_since(cls, mark: tuple[datetime.datetime, int] | None, limit: int) -> Select:
+        """
+        Rows created or updated after the (updated_at, id) high-water mark, oldest first.
+        Rows can still appear behind recent marks (replication lag, long transactions), so
+        callers only move their mark past rows older than a lookback margin (see delta_sync).
+        """
+        query = select(cls)
+        if mark is not None:
+            updated_at, id = mark
+            query = query.where(or_(cls.updated_at > updated_at, and_(cls.updated_at == updated_at, cls.id > id)))
+        return query.order_by(cls.updated_at, cls.id).limit(limit)
+
+    @classmethod
+    def select_high_water_mark(cls, before: datetime.datetime | None = None) -> Select:
+        """(updated_at, id) of the newest row, or of the newest row older than `before`."""
+        query = select(cls.updated_at, cls.id)
+        if before is not None:
+            query = query.where(cls.updated_at < before)
+        return query.order_by(cls.updated_at.desc(), cls.id.desc()).limit(1)
@@ -1,4 +1,6 @@
 from sqlalchemy import (
+    INTEGER,
+    Index,
     String,
 )
 from sqlalchemy.orm import Mapped, mapped_column, registry
@@ -8,4 +10,21 @@ mapper_registry = registry()
 
 class Organization(ModelBase):
     __tablename__ = "organizations"
+    __table_args__ = (
+        Index("ix_organizations_updated_at_id", "updated_at", "id"),
+        Index("ix_organizations_name", "name"),
+        Index("ft_organizations_name", "name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
     name: Mapped[str] = mapped_column(String(60))
+
+
+class Tombstone(ModelBase):
+    """
+    Deleted rows of other tables, written by AFTER DELETE triggers. updated_at is the deletion time.
+    Kept for SYNC_TOMBSTONE_RETENTION_DAYS: `python delta_sync.py prune-tombstones` deletes older ones.
+    """
+
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_table_name_updated_at_id", "table_name", "updated_at", "id"),)
+    table_name: Mapped[str] = mapped_column(String(64))
+    row_id: Mapped[int] = mapped_column(INTEGER)
@@ -0,0 +1,63 @@
+import os
+from typing import Any, Dict, Final
+
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.dialects.mysql import match
+
+from api_service import scatter_gather
+from models.models import Organization
+
+# must match the server's ngram_token_size; shorter queries can only use the prefix index
+ngram_token_size: Final[int] = int(os.getenv("NGRAM_TOKEN_SIZE", "2"))
+search_max_limit: Final[int] = 50
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_organizations(q: str, limit: int, offset: int) -> Dict[str, Any]:
+    """
+    Prefix matches first (B-tree index on name, by code point), then substring matches
+    (FULLTEXT ngram index, by relevance). Each shard returns its best offset + limit + 1
+    matches per branch, already ranked, and the shards' lists are merged.
+    Relevance scores come from each shard's own corpus statistics, so across shards the
+    substring matches are only interleaved by score, not ranked against one another.
+    A blank query matches nothing.
+    """
+    term = q.strip()
+    if not term:
+        return {"items": [], "has_more": False}
+    window = offset + limit + 1
+    prefix = _escape_like(term) + "%"
+    # the merge compares names in Python, so the shards must order them by code point too
+    # (the column collation is case and accent insensitive)
+    name_order = Organization.name.collate("utf8mb4_bin")
+    prefix_matches = (
+        select(Organization.id, Organization.name, literal(1).label("rank"), literal(0.0).label("score"))
+        .where(Organization.name.like(prefix, escape="\\"))
+        .order_by(name_order)
+        .limit(window)
+    )
+    if len(term) < ngram_token_size:
+        query = prefix_matches
+    else:
+        # a quoted phrase makes every ngram of the term match consecutively, i.e. a substring match
+        relevance = match(Organization.name, against='"' + term.replace('"', " ") + '"').in_boolean_mode()
+        substring_matches = (
+            select(Organization.id, Organization.name, literal(0).label("rank"), relevance.label("score"))
+            .where(relevance, Organization.name.not_like(prefix, escape="\\"))
+            .order_by(relevance.desc(), name_order)
+            .limit(window)
+        )
+        matches = union_all(prefix_matches, substring_matches).subquery()
+        query = (
+            select(matches.c.id, matches.c.name, matches.c.rank, matches.c.score)
+            .order_by(matches.c.rank.desc(), matches.c.score.desc(), matches.c.name.collate("utf8mb4_bin"))
+            .limit(window)
+        )
+    rows = (await scatter_gather(query, key=lambda row: (-row.rank, -row.score, row.name), limit=window))[offset:]
+    return {
+        "items": [{"id": row.id, "name": row.name} for row in rows[:limit]],
+        "has_more": len(rows) > limit,
+    }
@@ -0,0 +1,9 @@
+import os
+
+# db.py reads these at import time; engines are created lazily and never connect in unit tests
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_HOST_REPLICATIONS", "['localhost']")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("DB_PASSWORD", "")
+os.environ.setdefault("DB_USER", "root")
+os.environ.setdefault("DB_POOL_SIZE", "1")
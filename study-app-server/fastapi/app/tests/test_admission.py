@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import admission
+from admission import AdmissionControlMiddleware, ClientRateLimiter, RouteClass, route_class_for
+from db import ConcurrencyLimit, db_max_overflow, db_pool_size
+
+
+def test_rate_limiter_allows_burst_then_reports_wait():
+    limiter = ClientRateLimiter(rate=10, burst=3, max_tracked=10)
+    assert [limiter.take("a") for _ in range(3)] == [0, 0, 0]
+    wait = limiter.take("a")
+    assert 0 < wait <= 0.1
+    # other clients have their own bucket
+    assert limiter.take("b") == 0
+
+
+def test_rate_limiter_evicts_least_recently_seen():
+    limiter = ClientRateLimiter(rate=1, burst=1, max_tracked=2)
+    limiter.take("a")
+    limiter.take("b")
+    limiter.take("c")
+    # "a" was forgotten and starts with a full bucket again
+    assert limiter.take("a") == 0
+    assert limiter.take("c") > 0
+
+
+async def test_concurrency_limit_sheds_after_max_wait():
+    limit = ConcurrencyLimit(concurrency=1, max_queue=1, max_wait=0.01)
+    assert await limit.acquire()
+    assert not await limit.acquire()
+    limit.release()
+    assert await limit.acquire()
+    limit.release()
+
+
+async def test_concurrency_limit_sheds_when_queue_is_full():
+    limit = ConcurrencyLimit(concurrency=1, max_queue=1, max_wait=1)
+    assert await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    assert limit.waiting == 1
+    assert not await limit.acquire()
+    limit.release()
+    assert await waiter
+    limit.release()
+
+
+def test_exports_have_their_own_class_below_the_pool_size():
+    route_class = route_class_for("/api/export/organizations")
+    assert route_class is admission.export_route_class
+    assert route_class.concurrency < db_pool_size + db_max_overflow
+
+
+async def test_extra_exports_are_shed_before_the_response_starts(monkeypatch):
+    monkeypatch.setattr(admission, "route_classes", [("/api/export", RouteClass("export", 1, 0, 0.01))])
+    release = asyncio.Event()
+
+    async def export(request):
+        await release.wait()
+        return PlainTextResponse("done")
+
+    app = AdmissionControlMiddleware(Starlette(routes=[Route("/api/export/organizations", export)]))
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        running = asyncio.ensure_future(client.get("/api/export/organizations"))
+        await asyncio.sleep(0.01)
+        shed = await client.get("/api/export/organizations")
+        release.set()
+        assert (await running).status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+
+
+def test_requests_without_forwarded_for_are_still_rate_limited(monkeypatch):
+    monkeypatch.setattr(admission, "client_rate_limiter", ClientRateLimiter(rate=1, burst=1, max_tracked=10))
+    app = AdmissionControlMiddleware(Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))]))
+    client = TestClient(app)
+    assert client.get("/").status_code == 200
+    response = client.get("/", headers={"X-Forwarded-For": "10.0.0.1"})
+    assert response.status_code == 429
+    assert response.json() == {"detail": "ERROR.ADMISSION.TOO_MANY_REQUESTS"}
+
+
+def test_client_address_falls_back_to_the_peer():
+    assert admission._client_address({"type": "http", "headers": [], "client": ("10.0.0.2", 1234)}) == "10.0.0.2"
+    assert admission._client_address({"type": "http", "headers": [], "client": None}) == "unknown"
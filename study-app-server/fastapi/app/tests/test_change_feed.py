@@ -0,0 +1,50 @@
+import time
+
+from starlette.testclient import TestClient
+
+from change_feed import Subscriber, organization_feed
+
+
+async def test_subscriber_coalesces_rows_by_id():
+    subscriber = Subscriber(max_pending=10)
+    subscriber.push([{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+    subscriber.push([{"id": 1, "name": "c"}])
+    assert await subscriber.get() == {"type": "changes", "rows": [{"id": 2, "name": "b"}, {"id": 1, "name": "c"}]}
+
+
+async def test_subscriber_overflow_asks_for_resync():
+    subscriber = Subscriber(max_pending=2)
+    subscriber.push([{"id": 1}, {"id": 2}, {"id": 3}])
+    subscriber.push([{"id": 4}])
+    assert await subscriber.get() == {"type": "resync"}
+    subscriber.push([{"id": 5}])
+    assert await subscriber.get() == {"type": "changes", "rows": [{"id": 5}]}
+
+
+async def test_subscriber_get_returns_none_once_closed():
+    subscriber = Subscriber(max_pending=10)
+    subscriber.push([{"id": 1}])
+    subscriber.close()
+    assert await subscriber.get() is None
+
+
+def test_websocket_disconnect_unsubscribes(monkeypatch):
+    async def poll() -> None:
+        pass
+
+    monkeypatch.setattr(organization_feed, "_poll", poll)
+    from lifecycle import lifecycle
+    from main import app
+
+    # leaving the TestClient runs the shutdown event, which drains the worker for good
+    monkeypatch.setattr(lifecycle, "draining", False)
+    monkeypatch.setattr(lifecycle, "drain_started", None)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/organizations/feed"):
+            assert len(organization_feed.subscribers) == 1
+        for _ in range(100):
+            if not organization_feed.subscribers:
+                break
+            time.sleep(0.01)
+        assert len(organization_feed.subscribers) == 0
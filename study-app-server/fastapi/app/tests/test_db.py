@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from db import LazySession, create_sessionmaker, load_shards
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=AsyncAdaptedQueuePool)
+    async with engine.begin() as connection:
+        await connection.execute(text("CREATE TABLE log (id INTEGER PRIMARY KEY, event TEXT)"))
+    yield engine
+    await engine.dispose()
+
+
+async def log_count(engine) -> int:
+    async with engine.connect() as connection:
+        return (await connection.execute(text("SELECT count(*) FROM log"))).scalar_one()
+
+
+async def test_no_session_until_first_statement(engine):
+    created = []
+
+    def factory():
+        created.append(1)
+        return create_sessionmaker(engine)()
+
+    session = LazySession(factory)
+    await session.rollback()
+    await session.close()
+    assert created == []
+    assert engine.pool.checkedout() == 0
+
+    session = LazySession(factory)
+    assert await session.scalar(text("SELECT 1")) == 1
+    assert created == [1]
+    assert engine.pool.checkedout() == 1
+    await session.close()
+    assert engine.pool.checkedout() == 0
+
+
+async def test_release_after_statement_commits_each_statement(engine):
+    session = LazySession(create_sessionmaker(engine), release_after_statement=True)
+    await session.execute(text("INSERT INTO log (event) VALUES ('a')"))
+    assert engine.pool.checkedout() == 0
+    assert not session.in_transaction()
+    assert await log_count(engine) == 1
+    await session.close()
+
+
+async def test_release_after_statement_rolls_back_when_the_statement_raises(engine):
+    session = LazySession(
+        create_sessionmaker(engine),
+        release_after_statement=True,
+        begin_statements=[text("INSERT INTO log (event) VALUES ('begin')")],
+    )
+    with pytest.raises(OperationalError):
+        await session.execute(text("SELECT * FROM missing"))
+    assert engine.pool.checkedout() == 0
+    assert await log_count(engine) == 0
+    await session.close()
+
+
+async def test_begin_statements_run_once_per_transaction(engine):
+    begin = [text("INSERT INTO log (event) VALUES ('begin')")]
+
+    session = LazySession(create_sessionmaker(engine), begin_statements=begin)
+    await session.execute(text("SELECT 1"))
+    await session.execute(text("SELECT 1"))
+    await session.commit()
+    await session.close()
+    assert await log_count(engine) == 1
+
+    session = LazySession(create_sessionmaker(engine), release_after_statement=True, begin_statements=begin)
+    await session.execute(text("SELECT 1"))
+    await session.execute(text("SELECT 1"))
+    await session.close()
+    assert await log_count(engine) == 3
+
+
+def test_load_shards():
+    assert load_shards("") == []
+    shards = load_shards('[{"host": "db-0", "replications": ["db-0-r1"]}]')
+    assert shards == [{"host": "db-0", "replications": ["db-0-r1"]}]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "{}",
+        '[{"replications": ["db-0-r1"]}]',
+        '[{"host": "", "replications": ["db-0-r1"]}]',
+        '[{"host": "db-0"}]',
+        '[{"host": "db-0", "replications": []}]',
+        '[{"host": "db-0", "replications": "db-0-r1"}]',
+    ],
+)
+def test_load_shards_rejects_incomplete_entries(value):
+    with pytest.raises(ValueError):
+        load_shards(value)
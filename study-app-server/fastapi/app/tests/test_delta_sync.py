@@ -0,0 +1,124 @@
+import base64
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import delta_sync
+from db import LazySession, create_sessionmaker
+from delta_sync import InvalidCursor, changes_since, decode_cursor, encode_cursor, settled_mark
+from models.model_base import epoch_mark
+from models.models import Organization
+
+T = datetime.datetime(2026, 10, 19, 9, 0, 0)
+
+
+def test_cursor_round_trip():
+    positions = [((T, 42), (T + datetime.timedelta(seconds=1), 7)), (epoch_mark, (T, 3))]
+    assert decode_cursor(encode_cursor(positions)) == positions
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor([(epoch_mark, (T, 2**40))])
+    assert cursor == base64.urlsafe_b64encode(base64.urlsafe_b64decode(cursor)).decode()
+    assert all(c not in cursor for c in "+/")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not base64!",
+        base64.urlsafe_b64encode(b"1").decode(),
+        base64.urlsafe_b64encode(b'[[["2026-10-19T09:00:00", 1]]]').decode(),
+        base64.urlsafe_b64encode(b'[[["yesterday", 1], ["2026-10-19T09:00:00", 1]]]').decode(),
+        base64.urlsafe_b64encode(b'[[["2026-10-19T09:00:00", "x"], ["2026-10-19T09:00:00", 1]]]').decode(),
+    ],
+)
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor, match="ERROR.SYNC.INVALID_CURSOR"):
+        decode_cursor(cursor)
+
+
+def test_settled_mark_stops_at_the_lookback_margin():
+    rows = [
+        SimpleNamespace(updated_at=T, id=3),
+        SimpleNamespace(updated_at=T + datetime.timedelta(seconds=1), id=1),
+        SimpleNamespace(updated_at=T + datetime.timedelta(seconds=5), id=2),
+    ]
+    settled = T + datetime.timedelta(seconds=5)
+    assert settled_mark(epoch_mark, rows, settled) == (T + datetime.timedelta(seconds=1), 1)  # type: ignore
+    assert settled_mark(epoch_mark, rows, T) == epoch_mark  # type: ignore
+
+
+async def test_cursor_from_another_shard_count_is_invalid():
+    cursor = encode_cursor([(epoch_mark, epoch_mark), (epoch_mark, epoch_mark)])
+    with pytest.raises(InvalidCursor, match="ERROR.SYNC.INVALID_CURSOR"):
+        await changes_since(Organization, cursor, 10)
+
+
+@pytest.fixture
+async def sessionmaker(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as connection:
+        for table in (
+            "organizations (id INTEGER PRIMARY KEY, name TEXT",
+            "tombstones (id INTEGER PRIMARY KEY, table_name TEXT, row_id INTEGER",
+        ):
+            await connection.execute(text(f"CREATE TABLE {table}, created_at TIMESTAMP, updated_at TIMESTAMP)"))
+    sessionmaker = create_sessionmaker(engine)
+
+    async def on_every_shard(fn):
+        session = LazySession(sessionmaker, release_after_statement=True)
+        try:
+            return [await fn(SimpleNamespace(index=0), session)]
+        finally:
+            await session.close()
+
+    monkeypatch.setattr(delta_sync, "on_every_shard", on_every_shard)
+    yield sessionmaker
+    await engine.dispose()
+
+
+async def insert_tombstone(sessionmaker, row_id: int, age: datetime.timedelta) -> None:
+    async with sessionmaker() as session:
+        now = await session.scalar(text("SELECT CURRENT_TIMESTAMP"))
+        deleted_at = datetime.datetime.fromisoformat(now) - age
+        await session.execute(
+            text(
+                "INSERT INTO tombstones (table_name, row_id, created_at, updated_at) VALUES ('organizations', :id, :at, :at)"
+            ),
+            {"id": row_id, "at": deleted_at.isoformat(sep=" ")},
+        )
+        await session.commit()
+
+
+async def test_tombstones_mark_follows_the_clock_without_deletes(sessionmaker):
+    first = await changes_since(Organization, None, 10)
+    [(_, tombstones_mark)] = decode_cursor(first["cursor"])
+    assert tombstones_mark[0] > datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+
+    await insert_tombstone(sessionmaker, 7, datetime.timedelta(minutes=1))
+    page = await changes_since(
+        Organization, encode_cursor([(epoch_mark, (tombstones_mark[0] - datetime.timedelta(minutes=5), 0))]), 10
+    )
+    assert page["deletes"] == [7]
+
+
+async def test_cursor_older_than_tombstone_retention_is_invalid(sessionmaker):
+    expired = datetime.datetime.utcnow() - delta_sync.sync_tombstone_retention - datetime.timedelta(days=1)
+    with pytest.raises(InvalidCursor, match="ERROR.SYNC.INVALID_CURSOR"):
+        await changes_since(Organization, encode_cursor([(epoch_mark, (expired, 0))]), 10)
+
+
+async def test_prune_tombstones_deletes_only_expired_ones(sessionmaker, monkeypatch):
+    monkeypatch.setattr(delta_sync, "Shards", [SimpleNamespace(MainSessionLocal=sessionmaker)])
+    monkeypatch.setattr(delta_sync, "tombstone_prune_batch_size", 1)
+    await insert_tombstone(sessionmaker, 1, datetime.timedelta(days=40))
+    await insert_tombstone(sessionmaker, 2, datetime.timedelta(days=31))
+    await insert_tombstone(sessionmaker, 3, datetime.timedelta(days=1))
+    assert await delta_sync.prune_tombstones(datetime.timedelta(days=30)) == 2
+    async with sessionmaker() as session:
+        assert (await session.scalars(text("SELECT row_id FROM tombstones"))).all() == [3]
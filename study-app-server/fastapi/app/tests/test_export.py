@@ -0,0 +1,62 @@
+import gzip
+import io
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from starlette.testclient import TestClient
+
+import api_service
+from export import CsvEncoder, ExportError, ParquetEncoder, export_columns, export_table
+
+
+def test_only_allowlisted_tables_are_exported():
+    assert export_table("organizations").name == "organizations"
+    with pytest.raises(ExportError, match="ERROR.EXPORT.UNKNOWN_TABLE"):
+        export_table("tombstones")
+
+
+def test_unknown_column_is_rejected():
+    with pytest.raises(ExportError, match="ERROR.EXPORT.UNKNOWN_COLUMN"):
+        export_columns(export_table("organizations"), ["id", "password"])
+
+
+def test_csv_gzip_is_one_stream_across_chunks():
+    encoder = CsvEncoder(["id", "name"], "gzip")
+    data = encoder.encode(pd.DataFrame({"id": [1], "name": ["a"]}))
+    data += encoder.encode(pd.DataFrame({"id": [2], "name": ["b"]}))
+    data += encoder.finish()
+    assert gzip.decompress(data).decode() == "id,name\n1,a\n2,b\n"
+
+
+def test_parquet_schema_comes_from_column_types():
+    columns = export_columns(export_table("organizations"), ["id", "name", "updated_at"])
+    encoder = ParquetEncoder(columns, "snappy")
+    # all-null column in the first chunk, values in the next one
+    data = encoder.encode(pd.DataFrame({"id": [1], "name": [None], "updated_at": [None]}))
+    data += encoder.encode(
+        pd.DataFrame({"id": [2], "name": ["b"], "updated_at": [pd.Timestamp("2026-10-19 09:00:00").to_pydatetime()]})
+    )
+    data += encoder.finish()
+    table = pq.read_table(io.BytesIO(data))
+    assert str(table.schema.field("name").type) == "string"
+    assert table.column("name").to_pylist() == [None, "b"]
+    assert table.num_rows == 2
+
+
+def test_parquet_without_rows_keeps_the_schema():
+    encoder = ParquetEncoder(export_columns(export_table("organizations"), ["id", "name"]), None)
+    table = pq.read_table(io.BytesIO(encoder.finish()))
+    assert table.column_names == ["id", "name"]
+    assert table.num_rows == 0
+
+
+@pytest.mark.parametrize("token, header", [(None, "Bearer "), ("secret", None), ("secret", "Bearer wrong")])
+def test_export_endpoint_requires_token(monkeypatch, token, header):
+    monkeypatch.setattr(api_service, "export_api_token", token)
+    from main import app
+
+    headers = {"X-Authorization": header} if header is not None else {}
+    response = TestClient(app).get("/api/export/organizations", headers=headers)
+    assert response.status_code == 401
+    assert response.json() == {"detail": "ERROR.AUTH.UNAUTHORIZED"}
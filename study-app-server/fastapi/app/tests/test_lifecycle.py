@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from uvicorn import Config
+
+import lifecycle as lifecycle_module
+from change_feed import Subscriber, organization_feed
+from constants import Constants
+from lifecycle import Lifecycle, LifecycleMiddleware
+from worker import DrainingServer, DrainingUvicornWorker
+
+
+class FakeEngine:
+    def __init__(self, host: str) -> None:
+        self.url = SimpleNamespace(host=host)
+        self.sync_engine = SimpleNamespace(logging_name=f"<{host}>")
+        self.pool = SimpleNamespace(status=lambda: "Pool size: 1")
+        self.disposed = False
+
+    async def dispose(self) -> None:
+        self.disposed = True
+
+
+@pytest.fixture
+def lifecycle(monkeypatch):
+    lifecycle = Lifecycle(drain_timeout=1)
+    monkeypatch.setattr(lifecycle_module, "lifecycle", lifecycle)
+    return lifecycle
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    engines = [FakeEngine("db"), FakeEngine("db-replica")]
+    monkeypatch.setattr(lifecycle_module, "all_engines", lambda: engines)
+    return engines
+
+
+@pytest.fixture
+def client(lifecycle):
+    async def in_flight(request):
+        return JSONResponse({"in_flight": lifecycle.in_flight})
+
+    async def feed(websocket):
+        await websocket.accept()
+        await websocket.close()
+
+    app = Starlette(routes=[Route("/in-flight", in_flight), WebSocketRoute("/feed", feed)])
+    return TestClient(LifecycleMiddleware(app))
+
+
+def test_counts_in_flight_requests(client, lifecycle):
+    assert client.get("/in-flight").json() == {"in_flight": 1}
+    assert lifecycle.in_flight == 0
+
+
+def test_draining_turns_http_away(client, lifecycle):
+    lifecycle.begin_drain()
+    response = client.get("/in-flight")
+    assert response.status_code == 503
+    assert response.headers["connection"] == "close"
+    assert response.headers["retry-after"] == "1"
+    assert response.json() == {"detail": "ERROR.LIFECYCLE.DRAINING"}
+
+
+def test_draining_closes_websockets_with_1012(client, lifecycle):
+    lifecycle.begin_drain()
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect("/feed"):
+            pass
+    assert exc_info.value.code == 1012
+
+
+async def test_begin_drain_closes_feed_subscribers(monkeypatch, lifecycle):
+    subscriber = Subscriber(max_pending=10)
+    monkeypatch.setattr(organization_feed, "subscribers", {subscriber})
+    lifecycle.begin_drain()
+    assert await subscriber.get() is None
+
+
+async def test_shutdown_waits_for_in_flight_requests(lifecycle, engines):
+    lifecycle.request_started()
+    shutdown = asyncio.ensure_future(lifecycle.shutdown())
+    await asyncio.sleep(0.05)
+    assert not shutdown.done()
+    assert not any(engine.disposed for engine in engines)
+    lifecycle.request_finished()
+    await asyncio.wait_for(shutdown, 1)
+    assert all(engine.disposed for engine in engines)
+
+
+async def test_shutdown_gives_up_after_drain_timeout(lifecycle, engines):
+    lifecycle.drain_timeout = 0.05
+    lifecycle.request_started()
+    await asyncio.wait_for(lifecycle.shutdown(), 1)
+    assert lifecycle.in_flight == 1
+    assert all(engine.disposed for engine in engines)
+
+
+async def test_server_starts_the_drain_when_told_to_exit(lifecycle):
+    server = DrainingServer(Config(app=Starlette()))
+    assert not await server.on_tick(1)
+    assert not lifecycle.draining
+    server.should_exit = True
+    assert await server.on_tick(1)
+    assert lifecycle.draining
+
+
+def test_worker_cancels_requests_after_the_drain_timeout():
+    assert DrainingUvicornWorker.CONFIG_KWARGS["timeout_graceful_shutdown"] == Constants.DRAIN_TIMEOUT
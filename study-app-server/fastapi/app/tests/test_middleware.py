@@ -0,0 +1,132 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware import FastPathMiddleware
+
+ORIGIN = "http://localhost:4200"
+
+
+async def small(request):
+    return PlainTextResponse("hello")
+
+
+async def large(request):
+    return PlainTextResponse("x" * 5000)
+
+
+async def streamed(request):
+    async def chunks():
+        for _ in range(10):
+            yield "y" * 1000
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+async def events(request):
+    async def chunks():
+        for _ in range(10):
+            yield "data: " + "z" * 1000 + "\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+async def own_cors(request):
+    return JSONResponse({}, headers={"Access-Control-Allow-Origin": "*"})
+
+
+@pytest.fixture
+def client():
+    app = Starlette(
+        routes=[
+            Route("/small", small),
+            Route("/large", large),
+            Route("/streamed", streamed),
+            Route("/events", events),
+            Route("/own-cors", own_cors),
+        ]
+    )
+    app.add_middleware(FastPathMiddleware, allow_origins=[ORIGIN, "https://*.kakeai.dev"], minimum_size=1000)
+    return TestClient(app)
+
+
+def preflight(client, origin):
+    return client.options(
+        "/small",
+        headers={
+            "Origin": origin,
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "x-authorization",
+        },
+    )
+
+
+def test_preflight_allowed(client):
+    response = preflight(client, ORIGIN)
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["access-control-allow-headers"] == "x-authorization"
+    assert "POST" in response.headers["access-control-allow-methods"]
+    assert response.headers["vary"] == "Origin"
+
+
+def test_preflight_disallowed(client):
+    response = preflight(client, "https://evil.example.com")
+    assert response.status_code == 400
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_wildcard_origin_is_literal(client):
+    assert preflight(client, "https://app.kakeai.dev").status_code == 400
+    assert preflight(client, "https://*.kakeai.dev").status_code == 200
+
+
+def test_simple_request_cors_headers(client):
+    response = client.get("/small", headers={"Origin": ORIGIN})
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert response.headers["vary"] == "Origin"
+
+
+def test_simple_request_disallowed_origin(client):
+    response = client.get("/small", headers={"Origin": "https://evil.example.com"})
+    assert response.status_code == 200
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_app_cors_header_is_replaced(client):
+    response = client.get("/own-cors", headers={"Origin": ORIGIN})
+    assert response.headers.get_list("access-control-allow-origin") == [ORIGIN]
+
+
+def test_small_body_not_compressed(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "hello"
+
+
+def test_large_body_compressed(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip", "Origin": ORIGIN})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert "content-length" not in response.headers
+    assert response.text == "x" * 5000
+
+
+def test_streamed_body_compressed(client):
+    response = client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "y" * 10000
+
+
+def test_event_stream_not_compressed(client):
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_no_gzip_without_accept_encoding(client):
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "x" * 5000
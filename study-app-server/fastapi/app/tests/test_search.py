@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import mysql
+from starlette.testclient import TestClient
+
+import search
+from search import search_organizations
+
+
+@pytest.mark.parametrize("q", ["  ", "　", "\t\n"])
+def test_blank_query_is_rejected(q):
+    from main import app
+
+    response = TestClient(app).get("/api/organizations/search", params={"q": q})
+    assert response.status_code == 422
+
+
+async def test_blank_term_matches_nothing():
+    # never reaches the database
+    assert await search_organizations(" \x1c ", 20, 0) == {"items": [], "has_more": False}
+
+
+@pytest.mark.parametrize("q", ["a", "acme"])
+async def test_shards_order_names_like_the_merge(q, monkeypatch):
+    calls = []
+
+    async def scatter_gather(query, key=None, reverse=False, limit=None, scalars=False):
+        calls.append((query, key))
+        return []
+
+    monkeypatch.setattr(search, "scatter_gather", scatter_gather)
+    await search_organizations(q, 20, 0)
+    [(query, key)] = calls
+    sql = str(query.compile(dialect=mysql.dialect()))
+    assert sql.count("COLLATE utf8mb4_bin") == (1 if len(q) < search.ngram_token_size else 3)
+    # code point order, as utf8mb4_bin sorts
+    rows = [SimpleNamespace(rank=1, score=0.0, name=name) for name in ["acme", "ACME", "Äcme"]]
+    assert [row.name for row in sorted(rows, key=key)] == ["ACME", "acme", "Äcme"]
@@ -0,0 +1,37 @@
+import sys
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+from constants import Constants
+
+
+class DrainingServer(Server):
+    async def on_tick(self, counter: int) -> bool:
+        should_exit = await super().on_tick(counter)
+        if should_exit:
+            # SIGTERM or max_requests: stop taking work before uvicorn waits for connections to close.
+            # imported here so the gunicorn master, which loads this class, never imports the app
+            from lifecycle import lifecycle
+
+            lifecycle.begin_drain()
+        return should_exit
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    """
+    UvicornWorker that starts the drain (lifecycle.py) as soon as the worker is told to exit,
+    and cancels requests still running after Constants.DRAIN_TIMEOUT so the pools are disposed
+    before gunicorn's graceful_timeout kills the worker.
+    """
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": Constants.DRAIN_TIMEOUT}
+
+    async def _serve(self) -> None:
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)